@@ -6,22 +6,46 @@
 
 from __future__ import annotations
 
+import atexit
+import heapq
+import itertools
 import json
+import os
 import random
 import re
+import time
 import unicodedata
+from bisect import bisect_right
+from collections import deque
 from dataclasses import dataclass
+from html import escape as _html_escape
 from pathlib import Path
-from typing import Dict, List, Literal, Optional, Set, Tuple, Union
+from types import MappingProxyType
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import streamlit as st
 
 Scope = Literal["activities", "places"]
+T = TypeVar("T")
 
 # -----------------------------
 # DATA 
 # -----------------------------
-GENERIC_PHRASES = [
+GENERIC_PHRASES: Tuple[str, ...] = (
     "Can I have a moment, please?",
     "I know what I mean — I just need a second.",
     "Please give me a moment to organise my words.",
@@ -31,72 +55,72 @@ GENERIC_PHRASES = [
     "Can you say that more slowly?",
     "Sorry — my brain froze for a second.",
     "Let me restart that sentence.",
-]
+)
 
-ACTIVITIES: Dict[str, List[str]] = {
-    "Presentation": [
+ACTIVITIES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "Presentation": (
         "Let me restart that sentence.",
         "I’m nervous, but I understand the answer.",
         "I want to answer — I just need a moment.",
         "Can I quickly rephrase that?",
         "One second — I’m collecting my thoughts.",
-    ],
-    "Lecture": [
+    ),
+    "Lecture": (
         "Could you repeat that last part, please?",
         "Can you say that more slowly?",
         "I’m following — give me a second to write it down.",
         "Can I ask a quick clarification?",
-    ],
-    "Exam": [
+    ),
+    "Exam": (
         "I understand — can I restate it in my own words?",
         "I know the answer — I just need a second.",
         "Can I have a moment to organise my words?",
         "Sorry — I’m stuck for a second. Let me try again.",
-    ],
-    "Games": [
+    ),
+    "Games": (
         "Wait — my tongue is lagging 😂",
         "Give me a second, I’ll say it.",
         "I know what I want to say — one sec!",
         "Hold on — let me restart.",
-    ],
-    "Friends": [
+    ),
+    "Friends": (
         "Bro my tongue is protesting 😭",
         "Waittt — I’ll say it again 😂",
         "I swear I know the word… give me a sec 😅",
         "Let me restart before you roast me 😭",
         "My brain froze — not me!",
-    ],
-}
+    ),
+})
 
-PLACES: Dict[str, List[str]] = {
-    "Class": [
+PLACES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "Class": (
         "Can I have a moment, please?",
         "I know the answer — I just need a second.",
         "Sorry — I’m stuck for a second. Let me try again.",
         "Can you repeat the question, please?",
-    ],
-    "Library": [
+    ),
+    "Library": (
         "Sorry — can you say that more slowly?",
         "One second — I’m thinking.",
         "Can I rephrase that?",
-    ],
-    "Hall": [
+    ),
+    "Hall": (
         "I’m stuck — can I try again in a moment?",
         "Give me a moment to organise my words.",
-    ],
-    "Gym": [
+    ),
+    "Gym": (
         "Wait — let me restart 😅",
         "One sec — I’ll say it.",
-    ],
-    "School Gate": [
+    ),
+    "School Gate": (
         "Sorry — my brain froze for a second.",
         "Can I have a moment, please?",
-    ],
-    "Basketball Court": [
+    ),
+    "Basketball Court": (
         "Wait — my tongue is lagging 😂",
         "Give me a second, I’ll say it.",
-    ],
-}
+    ),
+})
 
 # -----------------------------
 # ROUTING
@@ -117,14 +141,22 @@ def get_route() -> Route:
     return Route(r["name"], r.get("scope"), r.get("category"))
 
 
+PHRASE_VIEWS = ("display", "fullscreen")
+
+
+def _after_navigation() -> None:
+    # a pending selected_phrase is written once the user leaves the phrase view
+    if st.session_state._selection_dirty and st.session_state.route["name"] not in PHRASE_VIEWS:
+        mark_dirty()
+
+
 def go(route: Route) -> None:
     """Navigation memory: push current route into nav_stack, then go to target route."""
     current = st.session_state.get("route")
     if current:
-        st.session_state.nav_stack.append(current)
-        if len(st.session_state.nav_stack) > 50:
-            st.session_state.nav_stack = st.session_state.nav_stack[-50:]
+        st.session_state.nav_stack.append(current)  # deque(maxlen=50) drops the oldest
     st.session_state.route = _route_dict(route)
+    _after_navigation()
 
 
 def nav_back(default: Route = Route("home")) -> None:
@@ -132,53 +164,52 @@ def nav_back(default: Route = Route("home")) -> None:
         st.session_state.route = st.session_state.nav_stack.pop()
     else:
         st.session_state.route = _route_dict(default)
+    _after_navigation()
 
 
 # -----------------------------
 # TEXT HELPERS (search)
 # -----------------------------
+_TOKEN_RE = re.compile(r"[a-z0-9']+", re.ASCII)
+_WS_RE = re.compile(r"\s+", re.ASCII)
+
+
 def normalize(text: str) -> str:
-    text = unicodedata.normalize("NFKD", text)
+    if text.isascii():
+        # ASCII is already NFKD with no combining marks
+        return _WS_RE.sub(" ", text.lower().strip())
+    if not unicodedata.is_normalized("NFKD", text):
+        text = unicodedata.normalize("NFKD", text)
     text = "".join(ch for ch in text if not unicodedata.combining(ch))
     text = text.lower().strip()
-    text = re.sub(r"\s+", " ", text)
+    text = _WS_RE.sub(" ", text)
     return text
 
 
-def tokens(text: str) -> List[str]:
-    return re.findall(r"[a-z0-9']+", normalize(text))
+def _tokens_from_normalized(norm: str) -> List[str]:
+    return _TOKEN_RE.findall(norm)
 
 
-def score_text(query: str, text: str) -> float:
-    """Token overlap + substring boost."""
-    q = normalize(query)
-    t = normalize(text)
-    if not q:
+def score_precomputed(q_norm: str, q_toks: FrozenSet[str], t_norm: str, t_toks: FrozenSet[str]) -> float:
+    """Token overlap + substring boost, on already-normalized inputs."""
+    if not q_norm:
         return 0.0
 
-    q_toks = set(tokens(q))
-    t_toks = set(tokens(t))
     overlap = len(q_toks & t_toks)
 
-    substr = 2.0 if q in t else 0.0
-    exact = 4.0 if q == t else 0.0
+    substr = 2.0 if q_norm in t_norm else 0.0
+    exact = 4.0 if q_norm == t_norm else 0.0
     return float(overlap) + substr + exact
 
 
-def dedupe_keep_order(items: List[str]) -> List[str]:
-    seen = set()
-    out: List[str] = []
-    for x in items:
-        if x not in seen:
-            out.append(x)
-            seen.add(x)
-    return out
+def dedupe_keep_order(items: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(items))
 
 
 # -----------------------------
 # DATA ACCESS HELPERS
 # -----------------------------
-def base_map(scope: Scope) -> Dict[str, List[str]]:
+def base_map(scope: Scope) -> Mapping[str, Tuple[str, ...]]:
     return ACTIVITIES if scope == "activities" else PLACES
 
 
@@ -186,20 +217,125 @@ def all_categories(scope: Scope) -> List[str]:
     return list(base_map(scope).keys())
 
 
-def all_phrases_global() -> List[str]:
+def custom_memo(name: str, build: Callable[[], T]) -> T:
+    """Per-session memo for values derived from custom_phrases, keyed on custom_version."""
+    version = st.session_state.custom_version
+    cached = st.session_state.get(name)
+    if cached is None or cached[0] != version:
+        cached = (version, build())
+        st.session_state[name] = cached
+    return cached[1]
+
+
+def _build_all_phrases() -> Tuple[str, ...]:
+    # the search indexes already hold each phrase once: static ones, then unseen custom ones
+    return tuple(p for index in (_phrase_index(), _custom_index()) for p, _, _ in index.entries)
+
+
+def all_phrases_global() -> Tuple[str, ...]:
+    """Frozen view of every phrase; rebuilt only when custom_version moves."""
+    return custom_memo("all_phrases_cache", _build_all_phrases)
+
+
+@st.cache_resource(show_spinner=False)
+def _base_plus_generic() -> Dict[Scope, Dict[str, Tuple[str, ...]]]:
+    """Deduped base + generic phrases per category, merged once per process."""
+    return {
+        sc: {cat: tuple(dict.fromkeys((*arr, *GENERIC_PHRASES))) for cat, arr in base_map(sc).items()}
+        for sc in ("activities", "places")
+    }
+
+
+def phrases_for(scope: Scope, category: str) -> Tuple[str, ...]:
+    custom = st.session_state.custom_phrases[scope].get(category, [])
+    if not custom:
+        merged = _base_plus_generic()[scope].get(category)
+        return merged if merged is not None else GENERIC_PHRASES
+    base = base_map(scope).get(category, ())
+    return tuple(dict.fromkeys((*base, *custom, *GENERIC_PHRASES)))
+
+
+# -----------------------------
+# SEARCH INDEX
+# -----------------------------
+# (original, normalized, token set)
+IndexEntry = Tuple[str, str, FrozenSet[str]]
+
+
+def _index_entry(phrase: str) -> IndexEntry:
+    norm = normalize(phrase)
+    return phrase, norm, frozenset(_tokens_from_normalized(norm))
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    entries: Tuple[IndexEntry, ...]
+    corpus: str  # normalized texts joined by "\n" (normalize never emits one)
+    starts: Tuple[int, ...]  # offset of each entry inside corpus
+    postings: Dict[str, Tuple[int, ...]]  # token -> entry positions
+
+
+def build_search_index(phrases: List[str]) -> SearchIndex:
+    entries = tuple(_index_entry(p) for p in phrases)
+    starts: List[int] = []
+    offset = 0
+    postings: Dict[str, List[int]] = {}
+    for i, (_, norm, toks) in enumerate(entries):
+        starts.append(offset)
+        offset += len(norm) + 1
+        for tok in toks:
+            postings.setdefault(tok, []).append(i)
+    return SearchIndex(
+        entries=entries,
+        corpus="\n".join(norm for _, norm, _ in entries),
+        starts=tuple(starts),
+        postings={k: tuple(v) for k, v in postings.items()},
+    )
+
+
+def index_candidates(index: SearchIndex, q_norm: str, q_toks: FrozenSet[str]) -> List[int]:
+    """Entry positions that share a token with the query or contain it, in index order."""
+    if not q_norm:
+        return []
+    found: Set[int] = set()
+    for tok in q_toks:
+        found.update(index.postings.get(tok, ()))
+    # one C-level scan over the whole corpus instead of a `q in t` test per phrase
+    at = index.corpus.find(q_norm)
+    while at != -1:
+        found.add(bisect_right(index.starts, at) - 1)
+        at = index.corpus.find(q_norm, at + 1)
+    return sorted(found)
+
+
+@st.cache_resource(show_spinner=False)
+def _phrase_index() -> SearchIndex:
+    """Static phrases are fixed for the process, so index them once."""
     out: List[str] = list(GENERIC_PHRASES)
     for sc in ("activities", "places"):
         for arr in base_map(sc).values():  # type: ignore[arg-type]
             out.extend(arr)
-        for arr in st.session_state.custom_phrases[sc].values():  # type: ignore[index]
-            out.extend(arr)
-    return dedupe_keep_order(out)
+    return build_search_index(dedupe_keep_order(out))
 
 
-def phrases_for(scope: Scope, category: str) -> List[str]:
-    base = base_map(scope).get(category, [])
-    custom = st.session_state.custom_phrases[scope].get(category, [])
-    return dedupe_keep_order(base + custom + GENERIC_PHRASES)
+@st.cache_resource(show_spinner=False)
+def _category_index() -> Tuple[Tuple[Scope, IndexEntry], ...]:
+    """Category names, normalized once; places first, as the search has always listed them."""
+    return tuple((sc, _index_entry(cat)) for sc in ("places", "activities") for cat in all_categories(sc))
+
+
+def _build_custom_index() -> SearchIndex:
+    static = {p for p, _, _ in _phrase_index().entries}
+    custom: List[str] = []
+    for sc in ("activities", "places"):
+        for arr in st.session_state.custom_phrases[sc].values():
+            custom.extend(p for p in arr if p not in static)
+    return build_search_index(dedupe_keep_order(custom))
+
+
+def _custom_index() -> SearchIndex:
+    """Per-session index over custom phrases, rebuilt lazily when custom_version moves."""
+    return custom_memo("custom_index_cache", _build_custom_index)
 
 
 # -----------------------------
@@ -209,26 +345,30 @@ DATA_DIR = Path(__file__).parent / "data"
 STATE_PATH = DATA_DIR / "qcs_state.json"
 
 
+def _str_list(v: object) -> List[str]:
+    if not isinstance(v, list):
+        return []
+    # the normal case is a clean list of strings: keep it instead of copying
+    if all(type(x) is str for x in v):
+        return v
+    return [str(x) for x in v]
+
+
 def _repair_loaded(obj: object) -> Tuple[Set[str], Dict[str, Dict[str, List[str]]], str]:
     favs: List[str] = []
     custom: Dict[str, Dict[str, List[str]]] = {"activities": {}, "places": {}}
     selected = ""
 
     if isinstance(obj, dict):
-        if isinstance(obj.get("favorites"), list):
-            favs = [str(x) for x in obj.get("favorites", [])]
+        favs = _str_list(obj.get("favorites"))
         if isinstance(obj.get("custom_phrases"), dict):
             raw = obj.get("custom_phrases", {})
-            if isinstance(raw.get("activities"), dict):
-                custom["activities"] = {
-                    str(k): [str(x) for x in (v if isinstance(v, list) else [])]
-                    for k, v in raw["activities"].items()
-                }
-            if isinstance(raw.get("places"), dict):
-                custom["places"] = {
-                    str(k): [str(x) for x in (v if isinstance(v, list) else [])]
-                    for k, v in raw["places"].items()
-                }
+            for sc in ("activities", "places"):
+                if isinstance(raw.get(sc), dict):
+                    custom[sc] = {
+                        k if type(k) is str else str(k): _str_list(v)
+                        for k, v in raw[sc].items()
+                    }
         if isinstance(obj.get("selected_phrase"), str):
             selected = obj.get("selected_phrase", "")
 
@@ -247,22 +387,95 @@ def load_state() -> None:
     favs, custom, selected = _repair_loaded(raw)
     st.session_state.favorites = favs
     st.session_state.custom_phrases = custom
+    _bump_custom_version()
     if not st.session_state.selected_phrase and selected:
         st.session_state.selected_phrase = selected
 
 
-def persist_now() -> None:
-    DATA_DIR.mkdir(exist_ok=True)
-    payload = {
-        "favorites": sorted(list(st.session_state.favorites)),
-        "custom_phrases": st.session_state.custom_phrases,
-        "selected_phrase": st.session_state.selected_phrase,
+def _build_payload(favorites: Set[str], custom: Dict[str, Dict[str, List[str]]], selected: str) -> dict:
+    return {
+        "favorites": sorted(list(favorites)),
+        "custom_phrases": custom,
+        "selected_phrase": selected,
     }
+
+
+PERSIST_DEBOUNCE_S = 0.5
+
+
+def _state_payload() -> dict:
+    ss = st.session_state
+    return _build_payload(ss.favorites, ss.custom_phrases, ss.selected_phrase)
+
+
+def _write_state(payload: dict) -> None:
+    DATA_DIR.mkdir(exist_ok=True)
     tmp = STATE_PATH.with_suffix(".tmp")
-    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    # compact JSON through one 64 KiB buffer; fsync before the rename keeps the swap atomic
+    with open(tmp, "w", encoding="utf-8", buffering=64 * 1024) as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
     tmp.replace(STATE_PATH)
 
 
+def _flush_pending(pending: dict) -> None:
+    """atexit hook: write the newest deferred state, if no later write superseded it."""
+    if pending.get("state") is not None:
+        _write_state(_build_payload(*pending["state"]))
+        pending["state"] = None
+
+
+@st.cache_resource(show_spinner=False)
+def _pending_write() -> dict:
+    """One slot and one atexit hook per process, shared by all sessions.
+
+    Every session writes the same file, so only the newest deferred state matters,
+    and any later write makes it stale.
+    """
+    pending: dict = {"state": None}
+    atexit.register(_flush_pending, pending)
+    return pending
+
+
+def _park_state() -> None:
+    # park references only; the payload is built by whichever write happens first
+    ss = st.session_state
+    _pending_write()["state"] = (ss.favorites, ss.custom_phrases, ss.selected_phrase)
+
+
+def persist_now() -> None:
+    _write_state(_state_payload())
+    st.session_state._dirty = False
+    st.session_state._selection_dirty = False
+    st.session_state._last_persist = time.monotonic()
+    _pending_write()["state"] = None
+
+
+def mark_dirty() -> None:
+    st.session_state._dirty = True
+
+
+def mark_selection_dirty() -> None:
+    """selected_phrase alone changes on every pick: defer it to navigation or exit."""
+    st.session_state._selection_dirty = True
+    _park_state()
+
+
+def flush_state() -> None:
+    """Runs at the end of every script run; writes at most once per PERSIST_DEBOUNCE_S.
+
+    A change that comes sooner stays dirty and is parked in the process-wide slot, so
+    the next run, or the exit hook, is the trailing write for the whole burst.
+    """
+    if not st.session_state._dirty:
+        return
+    if time.monotonic() - st.session_state._last_persist >= PERSIST_DEBOUNCE_S:
+        persist_now()
+    else:
+        _park_state()
+
+
 # -----------------------------
 # SELECTION / FAVORITES / CUSTOM MANAGEMENT
 # -----------------------------
@@ -272,9 +485,7 @@ def push_history(phrase: str) -> None:
     hist = st.session_state.history
     if hist and hist[-1] == phrase:
         return
-    hist.append(phrase)
-    if len(hist) > 50:
-        del hist[0]
+    hist.append(phrase)  # deque(maxlen=50) drops the oldest
 
 
 def set_selected(phrase: str, context_route: Optional[Route] = None) -> None:
@@ -285,7 +496,7 @@ def set_selected(phrase: str, context_route: Optional[Route] = None) -> None:
     if context_route and context_route.name == "category":
         st.session_state.last_category_route = _route_dict(context_route)
 
-    persist_now()
+    mark_selection_dirty()
 
 
 def toggle_favorite(phrase: str) -> None:
@@ -293,26 +504,37 @@ def toggle_favorite(phrase: str) -> None:
         st.session_state.favorites.remove(phrase)
     else:
         st.session_state.favorites.add(phrase)
-    persist_now()
+    mark_dirty()
+
+
+def _bump_custom_version() -> None:
+    st.session_state.custom_version += 1
 
 
 def add_custom_phrase(scope: Scope, category: str, phrase: str) -> None:
-    st.session_state.custom_phrases[scope].setdefault(category, []).append(phrase)
-    persist_now()
+    cp = st.session_state.custom_phrases
+    arr = cp[scope].setdefault(category, [])
+    arr.append(phrase)
+    _bump_custom_version()
+    mark_dirty()
 
 
 def edit_custom_phrase(scope: Scope, category: str, index: int, new_text: str) -> None:
-    arr = st.session_state.custom_phrases[scope].setdefault(category, [])
+    cp = st.session_state.custom_phrases
+    arr = cp[scope].setdefault(category, [])
     if 0 <= index < len(arr):
         arr[index] = new_text
-        persist_now()
+        _bump_custom_version()
+        mark_dirty()
 
 
 def delete_custom_phrase(scope: Scope, category: str, index: int) -> None:
-    arr = st.session_state.custom_phrases[scope].setdefault(category, [])
+    cp = st.session_state.custom_phrases
+    arr = cp[scope].setdefault(category, [])
     if 0 <= index < len(arr):
         arr.pop(index)
-        persist_now()
+        _bump_custom_version()
+        mark_dirty()
 
 
 # -----------------------------
@@ -324,13 +546,13 @@ if "route" not in st.session_state:
     st.session_state.route = _route_dict(Route("home"))
 
 if "nav_stack" not in st.session_state:
-    st.session_state.nav_stack = []
+    st.session_state.nav_stack = deque(maxlen=50)
 
 if "selected_phrase" not in st.session_state:
     st.session_state.selected_phrase = ""
 
 if "history" not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=50)
 
 if "favorites" not in st.session_state:
     st.session_state.favorites = set()
@@ -338,12 +560,20 @@ if "favorites" not in st.session_state:
 if "custom_phrases" not in st.session_state:
     st.session_state.custom_phrases = {"activities": {}, "places": {}}
 
+if "custom_version" not in st.session_state:
+    st.session_state.custom_version = 0  # bumped whenever custom_phrases changes
+
 if "last_category_route" not in st.session_state:
     st.session_state.last_category_route = None  # dict or None
 
 if "home_search" not in st.session_state:
     st.session_state.home_search = ""
 
+if "_dirty" not in st.session_state:
+    st.session_state._dirty = False
+    st.session_state._selection_dirty = False
+    st.session_state._last_persist = 0.0
+
 if "_loaded_once" not in st.session_state:
     load_state()
     st.session_state._loaded_once = True
@@ -352,8 +582,9 @@ if "_loaded_once" not in st.session_state:
 # -----------------------------
 # STYLE
 # -----------------------------
-st.markdown(
-    """
+@st.cache_resource(show_spinner=False)
+def _css() -> str:
+    return """
 <style>
 .block-container { padding-top: 2.2rem; padding-bottom: 2.0rem; max-width: 900px; }
 
@@ -436,9 +667,11 @@ div.stButton > button {
   color: rgba(255,255,255,0.98);
 }
 </style>
-""",
-    unsafe_allow_html=True,
-)
+"""
+
+
+# must be re-emitted on every run, but the string itself is built once per process
+st.markdown(_css(), unsafe_allow_html=True)
 
 
 # -----------------------------
@@ -465,7 +698,7 @@ def top_nav(show_back: bool = True, back_default: Route = Route("home")) -> None
 SearchHit = Union[Tuple[Literal["phrase"], str], Tuple[Literal["open_category"], Scope, str]]
 
 
-def home_search_box() -> None:
+def home_search_box(favs_set: Optional[Set[str]] = None) -> None:
     q = st.text_input(
         "SEARCH 🔎",
         value=st.session_state.home_search,
@@ -473,44 +706,46 @@ def home_search_box() -> None:
     )
     st.session_state.home_search = q
 
-    if not q.strip():
+    # a single character matches almost everything and ranks nothing usefully
+    q_norm = normalize(q)
+    if len(q_norm) < 2:
         return
 
     hits: List[Tuple[float, SearchHit]] = []
+    q_toks = frozenset(_tokens_from_normalized(q_norm))
 
-    # Phrase hits
-    for p in all_phrases_global():
-        s = score_text(q, p)
-        if s > 0:
-            hits.append((s, ("phrase", p)))
+    # Phrase hits (only candidates from the index are ranked)
+    for index in (_phrase_index(), _custom_index()):
+        for i in index_candidates(index, q_norm, q_toks):
+            p, t_norm, t_toks = index.entries[i]
+            s = score_precomputed(q_norm, q_toks, t_norm, t_toks)
+            if s > 0:
+                hits.append((s, ("phrase", p)))
 
     # Category hits
-    for cat in all_categories("places"):
-        s = score_text(q, cat)
+    for scope, (cat, t_norm, t_toks) in _category_index():
+        s = score_precomputed(q_norm, q_toks, t_norm, t_toks)
         if s > 0:
-            hits.append((s + 3.0, ("open_category", "places", cat)))
-    for cat in all_categories("activities"):
-        s = score_text(q, cat)
-        if s > 0:
-            hits.append((s + 3.0, ("open_category", "activities", cat)))
+            hits.append((s + 3.0, ("open_category", scope, cat)))
 
-    hits.sort(key=lambda x: x[0], reverse=True)
+    # same order as a stable descending sort, without sorting the whole list
+    top_scored = heapq.nlargest(12, hits, key=lambda x: x[0])
 
-    seen_keys: Set[str] = set()
+    seen_keys: Set[SearchHit] = set()
     top: List[SearchHit] = []
-    for _, h in hits:
-        key = str(h)
-        if key not in seen_keys:
+    for _, h in top_scored:
+        if h not in seen_keys:
             top.append(h)
-            seen_keys.add(key)
-        if len(top) >= 12:
-            break
+            seen_keys.add(h)
 
     st.markdown('<div class="section-title">Results</div>', unsafe_allow_html=True)
     if not top:
         st.info("No matches. Try fewer words.")
         return
 
+    if favs_set is None:
+        favs_set = st.session_state.favorites
+
     for i, h in enumerate(top):
         if h[0] == "open_category":
             _, scope, cat = h
@@ -527,13 +762,20 @@ def home_search_box() -> None:
                     go(Route("display"))
                     st.rerun()
             with cols[1]:
-                star = "★" if phrase in st.session_state.favorites else "☆"
+                star = "★" if phrase in favs_set else "☆"
                 if st.button(star, key=f"home_star_{i}", use_container_width=True):
                     toggle_favorite(phrase)
                     st.rerun()
 
 
-def phrase_list(phrases: List[str], key_prefix: str, context: Optional[Route] = None) -> None:
+def phrase_list(
+    phrases: Sequence[str],
+    key_prefix: str,
+    context: Optional[Route] = None,
+    favs_set: Optional[Set[str]] = None,
+) -> None:
+    if favs_set is None:
+        favs_set = st.session_state.favorites
     for i, p in enumerate(phrases):
         cols = st.columns([7, 1])
         with cols[0]:
@@ -542,18 +784,14 @@ def phrase_list(phrases: List[str], key_prefix: str, context: Optional[Route] =
                 go(Route("display"))
                 st.rerun()
         with cols[1]:
-            star = "★" if p in st.session_state.favorites else "☆"
+            star = "★" if p in favs_set else "☆"
             if st.button(star, key=f"{key_prefix}_fav_{i}", use_container_width=True):
                 toggle_favorite(p)
                 st.rerun()
 
 
 def phrase_box(phrase: str) -> None:
-    safe = (
-        phrase.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-    )
+    safe = _html_escape(phrase, quote=False)
     st.markdown(
         f"""
 <div class="big-phrase">
@@ -565,11 +803,7 @@ def phrase_box(phrase: str) -> None:
 
 
 def fullscreen_box(phrase: str) -> None:
-    safe = (
-        phrase.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-    )
+    safe = _html_escape(phrase, quote=False)
     st.markdown(
         f"""
 <div class="fullscreen-wrap">
@@ -580,21 +814,20 @@ def fullscreen_box(phrase: str) -> None:
     )
 
 
+def js_string(text: str) -> str:
+    """JS string literal for inline <script>; "</" is split so a phrase can't close the tag."""
+    return json.dumps(text).replace("</", "<\\/")
+
+
 def pinned_favorites_top5() -> List[str]:
     # deterministic order: most recently used first, then alphabetical
     favs = list(st.session_state.favorites)
     if not favs:
         return []
-    # prefer favorites that appear in history (recent usage)
-    hist_rev = list(reversed(st.session_state.history))
-    scored: List[Tuple[int, str]] = []
-    for f in favs:
-        try:
-            idx = hist_rev.index(f)
-            score = 1000 - idx  # earlier in hist_rev = more recent
-        except ValueError:
-            score = 0
-        scored.append((score, f))
+    # prefer favorites that appear in history (recent usage);
+    # later writes win, so each phrase maps to its most recent position
+    pos = {p: i for i, p in enumerate(st.session_state.history)}
+    scored: List[Tuple[int, str]] = [(pos.get(f, -1), f) for f in favs]
     scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
     return [f for _, f in scored[:5]]
 
@@ -603,8 +836,9 @@ def pinned_favorites_top5() -> List[str]:
 # PAGES
 # -----------------------------
 def page_home() -> None:
+    favs = st.session_state.favorites
     top_nav(show_back=False)
-    home_search_box()
+    home_search_box(favs_set=favs)
 
     st.markdown('<div class="h1">Quick Communication Support</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub">Discreet help when words get stuck.</div>', unsafe_allow_html=True)
@@ -675,7 +909,8 @@ def page_home() -> None:
 
     if st.session_state.history:
         st.markdown('<div class="section-title">Recent</div>', unsafe_allow_html=True)
-        phrase_list(list(reversed(st.session_state.history[-6:])), "home_recent", context=None)
+        recent = list(itertools.islice(reversed(st.session_state.history), 6))
+        phrase_list(recent, "home_recent", context=None, favs_set=favs)
 
 
 def page_scope_list(scope: Scope) -> None:
@@ -712,15 +947,16 @@ def page_category(scope: Scope, category: str) -> None:
         go(Route("display"))
         st.rerun()
 
+    custom_list = st.session_state.custom_phrases[scope].get(category, [])
+
     st.markdown('<div class="section-title">Tap a phrase</div>', unsafe_allow_html=True)
     context = Route("category", scope=scope, category=category)
     phrase_list(phrases_for(scope, category), f"{scope}_{category}", context=context)
 
-    # EDIT / DELETE custom phrases
-    custom_list = st.session_state.custom_phrases[scope].get(category, [])
+    # EDIT / DELETE custom phrases (every mutation below is followed by st.rerun)
     if custom_list:
         st.markdown('<div class="section-title">Edit / Delete custom phrases</div>', unsafe_allow_html=True)
-        for i, txt in enumerate(list(custom_list)):
+        for i, txt in enumerate(custom_list):
             row = st.columns([6, 1, 1])
             with row[0]:
                 new_val = st.text_input(
@@ -756,7 +992,7 @@ def page_category(scope: Scope, category: str) -> None:
                 st.warning("Type a phrase first.")
             else:
                 add_custom_phrase(scope, category, txt)
-                st.success("Saved to disk.")
+                st.success("Saved.")
                 st.rerun()
     with c2:
         if st.button("Go to Favorites", use_container_width=True):
@@ -771,13 +1007,14 @@ def page_display() -> None:
     if not phrase:
         st.info("No phrase selected yet. Go Home and pick one.")
         return
+    favs = st.session_state.favorites
 
     phrase_box(phrase)
 
     st.markdown('<div class="small-actions">', unsafe_allow_html=True)
     c1, c2, c3, c4 = st.columns([1, 1, 1, 1])
     with c1:
-        label = "★ Favorited" if phrase in st.session_state.favorites else "☆ Favorite"
+        label = "★ Favorited" if phrase in favs else "☆ Favorite"
         if st.button(label, use_container_width=True):
             toggle_favorite(phrase)
             st.rerun()
@@ -800,17 +1037,13 @@ def page_display() -> None:
     # Shows a success message after copying.
     if st.session_state.get("copy_text"):
         to_copy = st.session_state.copy_text
-        safe = (
-            to_copy.replace("\\", "\\\\")
-            .replace("`", "\\`")
-            .replace("$", "\\$")
-        )
+        safe = js_string(to_copy)
         st.components.v1.html(
             f"""
 <script>
 (async function() {{
   try {{
-    await navigator.clipboard.writeText(`{safe}`);
+    await navigator.clipboard.writeText({safe});
     const el = window.parent.document.querySelector('section.main');
     if(el){{}}
   }} catch(e) {{}}
@@ -830,13 +1063,14 @@ def page_fullscreen() -> None:
     if not phrase:
         st.session_state.route = _route_dict(Route("home"))
         st.rerun()
+    favs = st.session_state.favorites
 
     fullscreen_box(phrase)
 
     st.markdown('<div class="small-actions">', unsafe_allow_html=True)
     c1, c2, c3 = st.columns(3)
     with c1:
-        label = "★ Favorited" if phrase in st.session_state.favorites else "☆ Favorite"
+        label = "★ Favorited" if phrase in favs else "☆ Favorite"
         if st.button(label, use_container_width=True):
             toggle_favorite(phrase)
             st.rerun()
@@ -853,17 +1087,13 @@ def page_fullscreen() -> None:
 
     if st.session_state.get("copy_text"):
         to_copy = st.session_state.copy_text
-        safe = (
-            to_copy.replace("\\", "\\\\")
-            .replace("`", "\\`")
-            .replace("$", "\\$")
-        )
+        safe = js_string(to_copy)
         st.components.v1.html(
             f"""
 <script>
 (async function() {{
   try {{
-    await navigator.clipboard.writeText(`{safe}`);
+    await navigator.clipboard.writeText({safe});
   }} catch(e) {{}}
 }})();
 </script>
@@ -878,13 +1108,13 @@ def page_favorites() -> None:
     top_nav(show_back=True, back_default=Route("home"))
 
     st.markdown('<div class="h1">Favorites</div>', unsafe_allow_html=True)
-    favs = sorted(list(st.session_state.favorites))
+    favs = st.session_state.favorites
 
     if not favs:
         st.info("No favorites yet. Tap ☆ next to a phrase to save it.")
         return
 
-    phrase_list(favs, "favs", context=None)
+    phrase_list(sorted(favs), "favs", context=None, favs_set=favs)
 
 
 # -----------------------------
@@ -908,6 +1138,8 @@ else:
     st.session_state.route = _route_dict(Route("home"))
     st.rerun()
 
+flush_state()
+
 # -----------------------------
 # MOBILE PACKAGING PATH (notes)
 # -----------------------------